@@ -1,7 +1,10 @@
 import pandas as pd
 import numpy as np
-import json
+from numba import njit
+import math
+import orjson
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # define directories
@@ -10,10 +13,12 @@ DATA_DIR = SCRIPT_DIR / "data"
 POLLS_DIR = DATA_DIR / "polls"
 AVERAGES_DIR = DATA_DIR / "averages"
 LATEST_DIR = DATA_DIR / "latest"
+TRANSFORMED_DIR = DATA_DIR / "transformed"
 
 # ensure output directories exist
 AVERAGES_DIR.mkdir(parents=True, exist_ok=True)
 LATEST_DIR.mkdir(parents=True, exist_ok=True)
+TRANSFORMED_DIR.mkdir(parents=True, exist_ok=True)
 
 # parties and smoothing factor
 PARTIES = ['liberal', 'conservative', 'ndp', 'bloc', 'green', 'ppc', 'other']
@@ -27,6 +32,90 @@ PARTY_MAP = {
 }
 SMOOTHING_FACTOR = 0.25 # alpha for ewma
 
+# pretty-printed output, allowing numpy scalars from the dataframes
+JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+
+# raw party columns and the frontend field names they map to
+FRONTEND_PARTY_FIELDS = {
+    "LPC": "liberal",
+    "CPC": "conservative",
+    "NDP": "ndp",
+    "GPC": "green",
+    "PPC": "ppc",
+}
+
+# raw column names that may hold the pollster, in order of preference
+POLLSTER_FIELDS = ("Polling Firm", "Firm")
+
+def transform_poll_data(raw_polls: list[dict]) -> list[dict]:
+    """
+    transform raw poll data into the format expected by the frontend.
+    all polls are converted at once with vectorized column operations.
+
+    args:
+        raw_polls: list of raw poll dictionaries as scraped.
+
+    returns:
+        list of transformed poll dictionaries, skipping polls without a pollster or date.
+        missing party values are nan and serialize to null.
+    """
+    df = pd.DataFrame(raw_polls)
+    if df.empty or "Date (middle)" not in df.columns:
+        return []
+
+    missing = pd.Series(None, index=df.index, dtype=object)
+
+    # handle different field names for pollster, taking the first non-empty one
+    pollster = missing
+    for field in POLLSTER_FIELDS:
+        if field in df.columns:
+            pollster = pollster.where(pollster.fillna("") != "", df[field])
+    has_pollster = pollster.fillna("") != ""
+
+    transformed = pd.DataFrame({"date": df["Date (middle)"], "pollster": pollster})
+
+    # handle different field names for sample size
+    sample_size = df.get("Sample", missing).astype(str).str.replace(",", "", regex=False)
+    sample_size = pd.to_numeric(sample_size, errors="coerce")
+    # non-integral sizes can't be cast to Int64, so they become missing like other invalid values
+    transformed["sampleSize"] = sample_size.where(sample_size % 1 == 0).astype("Int64")
+
+    # convert string percentages to float numbers, invalid or missing values become nan
+    for source, field in FRONTEND_PARTY_FIELDS.items():
+        transformed[field] = pd.to_numeric(df.get(source, missing), errors="coerce").astype(float)
+    transformed["other"] = 0.0  # default to 0 since it's not in raw data
+    transformed["bloc"] = pd.to_numeric(df.get("BQ", missing), errors="coerce").astype(float)
+
+    # skip polls without a pollster or date
+    transformed = transformed[has_pollster & df["Date (middle)"].notna()]
+
+    # missing percentages are left as nan, which orjson serializes as null
+    sample_size = transformed["sampleSize"]
+    records = transformed.assign(
+        sampleSize=sample_size.astype(object).where(sample_size.notna(), None)
+    ).to_dict(orient="records")
+
+    # only include bloc if present (federal/quebec only)
+    for record in records:
+        if math.isnan(record["bloc"]):
+            del record["bloc"]
+
+    return records
+
+def _join_pollsters(pollsters: pd.Series) -> str:
+    """
+    join the unique pollster names of a categorical series, in order of appearance.
+
+    args:
+        pollsters: categorical series of pollster names for one date.
+
+    returns:
+        comma separated pollster names.
+    """
+    codes = pollsters.cat.codes.to_numpy()
+    unique_codes = pd.unique(codes[codes >= 0])
+    return ', '.join(pollsters.cat.categories[unique_codes])
+
 def preprocess_polls(df: pd.DataFrame) -> pd.DataFrame:
     """
     preprocess the raw poll data.
@@ -62,18 +151,16 @@ def preprocess_polls(df: pd.DataFrame) -> pd.DataFrame:
     else:
         df['sampleSize'] = 0 # add column if missing
 
-    # create a mask to track rows with empty strings
-    has_empty_strings = pd.Series(False, index=df.index)
-
-    # map party acronyms and convert to numeric, tracking empty strings
+    # map party acronyms and convert to numeric as one block of columns
+    acronyms = [acronym for acronym in PARTY_MAP if acronym in df.columns]
+    raw_shares = df[acronyms]
+    # mark rows where any party's value is an empty string
+    has_empty_strings = (np.char.strip(raw_shares.to_numpy(dtype=str)) == '').any(axis=1)
+    # convert to numeric, empty strings become nan
+    numeric_shares = raw_shares.apply(pd.to_numeric, errors='coerce')
     for acronym, party_key in PARTY_MAP.items():
-        if acronym in df.columns:
-            # mark rows where the value is an empty string
-            has_empty_strings |= (df[acronym].astype(str).str.strip() == '')
-            # convert to numeric, empty strings become nan
-            df[party_key] = pd.to_numeric(df[acronym], errors='coerce')
-        else:
-            df[party_key] = 0 # add column if missing
+        # add column if missing
+        df[party_key] = numeric_shares[acronym] if acronym in acronyms else 0
 
     # remove rows that had empty strings
     df = df[~has_empty_strings].copy()
@@ -89,27 +176,28 @@ def preprocess_polls(df: pd.DataFrame) -> pd.DataFrame:
 
     # select necessary columns
     keep_cols = ['date', 'pollster', 'sampleSize'] + PARTIES
-    df = df[keep_cols]
-
-    # group by date and calculate weighted average based on sample size
-    def weighted_average(group):
-        weights = group['sampleSize']
-        # if no sample sizes available, use simple average
-        if weights.sum() == 0:
-            weights = pd.Series(1, index=weights.index)
-
-        result = {}
-        # weighted average for each party
-        for party in PARTIES:
-            result[party] = np.average(group[party], weights=weights)
-        # keep track of total sample size and pollsters for reference
-        result['sampleSize'] = weights.sum()
-        result['pollster'] = ', '.join(group['pollster'].unique())
-        return pd.Series(result)
-
-    # group by date and apply weighted average, silencing the deprecation warning
-    # explicitly setting include_groups=false prepares for future pandas versions
-    df = df.groupby('date').apply(weighted_average, include_groups=False).reset_index()
+    df = df[keep_cols].copy()
+
+    # group by date and calculate weighted average based on sample size.
+    # weights are applied as pre-multiplied columns so the averages come from
+    # native groupby sums instead of a python callback per date
+    group_sample = df.groupby('date')['sampleSize'].transform('sum')
+    # if no sample sizes available for a date, use simple average
+    df['weight'] = df['sampleSize'].where(group_sample > 0, 1).astype(float)
+    weighted_cols = [f"{party}_w" for party in PARTIES]
+    for party, weighted_col in zip(PARTIES, weighted_cols):
+        df[weighted_col] = df[party] * df['weight']
+
+    # pollster names repeat across dates, so dedup them on small integer category codes
+    df['pollster'] = df['pollster'].astype('category')
+    grouped = df.groupby('date', sort=True)
+    weight_sums = grouped['weight'].sum()
+    averages = grouped[weighted_cols].sum().div(weight_sums, axis=0)
+    averages.columns = PARTIES
+    # keep track of total sample size and pollsters for reference
+    averages['sampleSize'] = weight_sums
+    averages['pollster'] = grouped['pollster'].agg(_join_pollsters)
+    df = averages.reset_index()
 
     # sort by date
     df.sort_values(by='date', inplace=True)
@@ -117,120 +205,144 @@ def preprocess_polls(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def calculate_ewma(series: pd.Series, alpha: float) -> pd.Series:
+@njit(cache=True, fastmath=True)
+def _ewma_2d(x: np.ndarray, alpha: float) -> np.ndarray:
     """
-    calculate exponentially weighted moving average.
+    calculate exponentially weighted moving average down each column.
 
     args:
-        series: time series data for a single party.
+        x: array of shape (n_dates, n_parties).
         alpha: smoothing factor.
 
     returns:
-        pandas series with ewma values.
+        array of the same shape with ewma values.
     """
-    # ensure we handle the first value correctly as in the original ts code
-    # pandas ewm with adjust=false matches the formula:
     # new_ewma = previous_ewma + alpha * (current_value - previous_ewma)
-    return series.ewm(alpha=alpha, adjust=False).mean()
-
-def normalize_vote_share(df: pd.DataFrame) -> pd.DataFrame:
+    out = np.empty_like(x)
+    if x.shape[0] == 0:
+        return out
+    out[0] = x[0]
+    for i in range(1, x.shape[0]):
+        for j in range(x.shape[1]):
+            out[i, j] = out[i - 1, j] + alpha * (x[i, j] - out[i - 1, j])
+    return out
+
+def normalize_vote_share(shares: np.ndarray) -> np.ndarray:
     """
     normalize vote shares for each party to sum to 100% for each date.
+    the given array is overwritten in place, so no copy of it is made.
 
     args:
-        df: dataframe with ewma values for each party.
+        shares: array of ewma values, one row per date and one column per party.
 
     returns:
-        dataframe with normalized vote shares.
+        the same array holding the normalized vote shares.
     """
-    df_normalized = df.copy()
     # calculate the total vote share for the parties we are tracking
-    df_normalized['total'] = df_normalized[PARTIES].sum(axis=1)
-
-    # avoid division by zero
-    non_zero_total = df_normalized['total'] != 0
+    total = shares.sum(axis=1, keepdims=True)
 
-    # normalize each party's share
-    for party in PARTIES:
-        df_normalized.loc[non_zero_total, party] = (df_normalized.loc[non_zero_total, party] / df_normalized.loc[non_zero_total, 'total']) * 100
+    # normalize every party's share at once, avoiding division by zero
+    np.divide(shares, np.where(total == 0, 1, total), out=shares)
+    shares *= 100
+    return shares
 
-    # select only date and party columns
-    df_normalized = df_normalized[['date'] + PARTIES]
-    return df_normalized
-
-def aggregate_polls():
+def _process_region(poll_file: Path) -> None:
     """
-    main function to process all poll files.
+    process a single region's poll file and write its averages and latest data.
+
+    args:
+        poll_file: path to the region's raw poll json file.
     """
-    print("starting poll aggregation...")
-    for poll_file in POLLS_DIR.glob("polls_*.json"):
-        region = poll_file.stem.split('_')[1]
-        print(f"processing region: {region}...")
+    region = poll_file.stem.split('_')[1]
+    print(f"processing region: {region}...")
+
+    try:
+        raw_data = orjson.loads(poll_file.read_bytes())
+
+        if not raw_data:
+            print(f"no data found for {region}, skipping.")
+            return
 
+        # --- save polls in the frontend format so the api can serve them as static files ---
+        # (a failure here must not cost the region its averages and latest data)
+        transformed_output_path = TRANSFORMED_DIR / f"{region}.json"
         try:
-            with open(poll_file, 'r', encoding='utf-8') as f:
-                raw_data = json.load(f)
+            transformed_bytes = orjson.dumps(transform_poll_data(raw_data))
+            with open(transformed_output_path, 'wb') as f:
+                f.write(transformed_bytes)
+            print(f"saved transformed polls to {transformed_output_path}")
+        except Exception as e:
+            print(f"error transforming polls for {region}: {e}")
+
+        df = pd.DataFrame(raw_data)
+        df_processed = preprocess_polls(df)
 
-            if not raw_data:
-                print(f"no data found for {region}, skipping.")
-                continue
+        if df_processed.empty:
+            print(f"no processable data after cleaning for {region}, skipping.")
+            return
 
-            df = pd.DataFrame(raw_data)
-            df_processed = preprocess_polls(df)
+        # calculate ewma for all parties in one pass
+        ewma_values = _ewma_2d(df_processed[PARTIES].to_numpy(np.float64), SMOOTHING_FACTOR)
 
-            if df_processed.empty:
-                print(f"no processable data after cleaning for {region}, skipping.")
-                continue
+        # normalize ewma data in place on the fresh array, before pandas wraps it
+        # (arrays taken back out of a frame are read-only under copy-on-write)
+        normalize_vote_share(ewma_values)
 
-            # calculate ewma for each party
-            ewma_data = {'date': df_processed['date']}
+        # wrap the normalized array without copying it
+        df_normalized = pd.DataFrame(ewma_values, columns=PARTIES, index=df_processed.index, copy=False)
+        df_normalized.insert(0, 'date', df_processed['date'])
+
+        # convert date back to string format yyyy-mm-dd for json
+        df_normalized['date'] = df_normalized['date'].dt.strftime('%Y-%m-%d')
+
+        # --- save averaged data ---
+        averages_output_path = AVERAGES_DIR / f"{region}_averages.json"
+        averages_data = df_normalized.to_dict(orient='records')
+        with open(averages_output_path, 'wb') as f:
+            f.write(orjson.dumps(averages_data, option=JSON_OPTIONS))
+        print(f"saved averaged data to {averages_output_path}")
+
+
+        # --- calculate and save latest data and changes ---
+        latest_values = {}
+        changes = {}
+        if len(df_normalized) >= 2:
+            latest_row = df_normalized.iloc[-1]
+            previous_row = df_normalized.iloc[-2]
             for party in PARTIES:
-                ewma_data[party] = calculate_ewma(df_processed[party], SMOOTHING_FACTOR)
-
-            df_ewma = pd.DataFrame(ewma_data)
-
-            # normalize ewma data
-            df_normalized = normalize_vote_share(df_ewma)
-
-            # convert date back to string format yyyy-mm-dd for json
-            df_normalized['date'] = df_normalized['date'].dt.strftime('%Y-%m-%d')
-
-            # --- save averaged data ---
-            averages_output_path = AVERAGES_DIR / f"{region}_averages.json"
-            averages_data = df_normalized.to_dict(orient='records')
-            with open(averages_output_path, 'w', encoding='utf-8') as f:
-                json.dump(averages_data, f, indent=2, ensure_ascii=False)
-            print(f"saved averaged data to {averages_output_path}")
-
-
-            # --- calculate and save latest data and changes ---
-            latest_values = {}
-            changes = {}
-            if len(df_normalized) >= 2:
-                latest_row = df_normalized.iloc[-1]
-                previous_row = df_normalized.iloc[-2]
-                for party in PARTIES:
-                    latest_values[party] = latest_row[party]
-                    changes[party] = latest_row[party] - previous_row[party]
-            elif len(df_normalized) == 1:
-                 latest_row = df_normalized.iloc[-1]
-                 for party in PARTIES:
-                    latest_values[party] = latest_row[party]
-                    changes[party] = None # no previous data to compare
-
-            latest_data = {
-                "latestValues": latest_values,
-                "changes": changes
-            }
-            latest_output_path = LATEST_DIR / f"{region}_latest.json"
-            with open(latest_output_path, 'w', encoding='utf-8') as f:
-                json.dump(latest_data, f, indent=2, ensure_ascii=False)
-            print(f"saved latest data to {latest_output_path}")
+                latest_values[party] = latest_row[party]
+                changes[party] = latest_row[party] - previous_row[party]
+        elif len(df_normalized) == 1:
+             latest_row = df_normalized.iloc[-1]
+             for party in PARTIES:
+                latest_values[party] = latest_row[party]
+                changes[party] = None # no previous data to compare
+
+        latest_data = {
+            "latestValues": latest_values,
+            "changes": changes
+        }
+        latest_output_path = LATEST_DIR / f"{region}_latest.json"
+        with open(latest_output_path, 'wb') as f:
+            f.write(orjson.dumps(latest_data, option=JSON_OPTIONS))
+        print(f"saved latest data to {latest_output_path}")
+
+    except Exception as e:
+        print(f"error processing {region}: {e}")
 
-        except Exception as e:
-            print(f"error processing {region}: {e}")
+def aggregate_polls():
+    """
+    main function to process all poll files.
+    regions are independent, so each one is processed in its own worker process.
+    """
+    print("starting poll aggregation...")
+    poll_files = list(POLLS_DIR.glob("polls_*.json"))
+    if poll_files:
+        max_workers = min(len(poll_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_process_region, poll_files))
 
     print("poll aggregation finished.")
 
 if __name__ == "__main__":
-    aggregate_polls() 
\ No newline at end of file
+    aggregate_polls()
\ No newline at end of file
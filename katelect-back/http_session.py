@@ -0,0 +1,75 @@
+import threading
+import time
+
+from pathlib import Path
+
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# on-disk http cache for scraped pages (sqlite adds the file extension)
+CACHE_PATH = Path(__file__).parent / ".http_cache"
+
+class RateLimiter:
+    """spaces out calls to wait() so that at most `rate` happen per second, across threads."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        """block until the caller is allowed to send its next request."""
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+class RateLimitedAdapter(HTTPAdapter):
+    """http adapter that waits on a rate limiter before every request that goes over the network."""
+
+    def __init__(self, rate_limiter: RateLimiter | None = None, **kwargs) -> None:
+        self.rate_limiter = rate_limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait()
+        return super().send(request, **kwargs)
+
+def create_session(
+    headers: dict[str, str],
+    expire_after: int,
+    requests_per_second: float | None = None,
+) -> requests_cache.CachedSession:
+    """
+    create a requests session that keeps connections to the scraped host alive,
+    retries transient failures and caches pages on disk between runs.
+    expired pages are revalidated with conditional requests (etag/last-modified).
+
+    args:
+        headers: headers to send with every request
+        expire_after: seconds a cached page is used without revalidating it
+        requests_per_second: optional limit on requests sent over the network
+
+    returns:
+        configured requests session
+    """
+    session = requests_cache.CachedSession(
+        cache_name=str(CACHE_PATH),
+        backend="sqlite",
+        expire_after=expire_after,
+        cache_control=True,
+    )
+    session.headers.update(headers)
+
+    # reuse pooled connections instead of a new tcp+tls handshake per page
+    retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+    adapter = RateLimitedAdapter(rate_limiter, pool_connections=1, pool_maxsize=20, max_retries=retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
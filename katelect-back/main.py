@@ -1,15 +1,21 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, ORJSONResponse
+from functools import lru_cache
 from pathlib import Path
-import json
+import orjson
+import os
 import uvicorn
 
+from riding_predictor import get_predictor
+
 # Define directories
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR / "data"
 POLLS_DIR = DATA_DIR / "polls"
 AVERAGES_DIR = DATA_DIR / "averages"
 LATEST_DIR = DATA_DIR / "latest"
+TRANSFORMED_DIR = DATA_DIR / "transformed"
 
 # Mapping from file codes (ab, qc) to frontend names (alberta, quebec)
 # Ensure these names match the keys in regionDisplayNames in Polls.tsx
@@ -23,48 +29,6 @@ REGION_CODE_TO_NAME = {
     "qc": "quebec",
 }
 
-def transform_poll_data(raw_poll):
-    """transform raw poll data into the format expected by the frontend."""
-    try:
-        # convert string percentages to float numbers
-        def safe_float(value):
-            try:
-                return float(value) if value and value.strip() else None
-            except (ValueError, TypeError):
-                return None
-
-        # handle different field names for pollster
-        pollster = raw_poll.get("Polling Firm") or raw_poll.get("Firm")
-        if not pollster:
-            raise ValueError("No pollster field found")
-
-        # handle different field names for sample size
-        sample_size = raw_poll.get("Sample")
-        sample_size = int(sample_size.replace(",", "")) if sample_size else None
-
-        # get party percentages, handling missing fields
-        transformed = {
-            "date": raw_poll["Date (middle)"],
-            "pollster": pollster,
-            "sampleSize": sample_size,
-            "liberal": safe_float(raw_poll.get("LPC")),
-            "conservative": safe_float(raw_poll.get("CPC")),
-            "ndp": safe_float(raw_poll.get("NDP")),
-            "green": safe_float(raw_poll.get("GPC")),
-            "ppc": safe_float(raw_poll.get("PPC")),
-            "other": 0.0  # default to 0 since it's not in raw data
-        }
-
-        # only include bloc if present (federal/quebec only)
-        bloc_value = safe_float(raw_poll.get("BQ"))
-        if bloc_value is not None:
-            transformed["bloc"] = bloc_value
-
-        return transformed
-    except Exception as e:
-        print(f"Error transforming poll data: {e}")
-        return None
-
 # Reverse mapping for internal file lookup
 NAME_TO_REGION_CODE = {v: k for k, v in REGION_CODE_TO_NAME.items()}
 
@@ -72,7 +36,10 @@ NAME_TO_REGION_CODE = {v: k for k, v in REGION_CODE_TO_NAME.items()}
 VALID_CODES = [f.stem.split('_')[1] for f in POLLS_DIR.glob("polls_*.json")]
 VALID_REGIONS = sorted([REGION_CODE_TO_NAME[code] for code in VALID_CODES if code in REGION_CODE_TO_NAME])
 
-app = FastAPI()
+# The region list never changes after startup, so encode the response once
+_REGIONS_BYTES = orjson.dumps(VALID_REGIONS)
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # cors middleware to allow requests from the frontend (adjust origins if necessary)
 app.add_middleware(
@@ -88,12 +55,31 @@ def read_json_file(file_path: Path):
     if not file_path.exists():
         return None
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError) as e:
+        return orjson.loads(file_path.read_bytes())
+    except (orjson.JSONDecodeError, IOError) as e:
         print(f"Error reading file {file_path}: {e}") # Log error
         return None
 
+@lru_cache(maxsize=32)
+def _load_serialized(path_str: str, mtime_ns: int) -> bytes | None:
+    """read a json file once per modification time, returning encoded bytes."""
+    data = read_json_file(Path(path_str))
+    if data is None:
+        return None
+    return orjson.dumps(data)
+
+def load_json_response(file_path: Path) -> Response | None:
+    """helper function to serve a json file from the in-memory cache, refreshed when the file changes."""
+    try:
+        mtime_ns = file_path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+    content = _load_serialized(str(file_path), mtime_ns)
+    if content is None:
+        return None
+    return Response(content, media_type="application/json")
+
 @app.get("/api/polls/{region_name}")
 async def get_raw_polls(region_name: str):
     """endpoint to get raw polling data for a specific region (using full name)."""
@@ -105,15 +91,12 @@ async def get_raw_polls(region_name: str):
     if not region_code:
          raise HTTPException(status_code=500, detail=f"Internal error mapping region name '{region_name}'.")
 
-    file_path = POLLS_DIR / f"polls_{region_code}.json"
-    data = read_json_file(file_path)
-
-    if data is None:
+    # polls are transformed into the frontend format by aggregate_polls.py, so serve the file as-is
+    file_path = TRANSFORMED_DIR / f"{region_code}.json"
+    if not file_path.is_file():
         raise HTTPException(status_code=500, detail=f"Could not load raw poll data for region '{region_name}'.")
 
-    # Transform each poll into the expected format
-    transformed_data = [transformed for poll in data if (transformed := transform_poll_data(poll)) is not None]
-    return transformed_data
+    return FileResponse(file_path, media_type="application/json")
 
 @app.get("/api/averages/{region_name}")
 async def get_averaged_polls(region_name: str):
@@ -126,12 +109,12 @@ async def get_averaged_polls(region_name: str):
          raise HTTPException(status_code=500, detail=f"Internal error mapping region name '{region_name}'.")
 
     file_path = AVERAGES_DIR / f"{region_code}_averages.json"
-    data = read_json_file(file_path)
+    response = load_json_response(file_path)
 
-    if data is None:
+    if response is None:
         raise HTTPException(status_code=500, detail=f"Could not load averaged poll data for region '{region_name}'.")
 
-    return data
+    return response
 
 @app.get("/api/latest/{region_name}")
 async def get_latest_polls(region_name: str):
@@ -144,18 +127,29 @@ async def get_latest_polls(region_name: str):
          raise HTTPException(status_code=500, detail=f"Internal error mapping region name '{region_name}'.")
 
     file_path = LATEST_DIR / f"{region_code}_latest.json"
-    data = read_json_file(file_path)
+    response = load_json_response(file_path)
 
-    if data is None:
+    if response is None:
         raise HTTPException(status_code=500, detail=f"Could not load latest poll data for region '{region_name}'.")
 
-    return data
+    return response
+
+@app.get("/api/seats")
+async def get_seat_projection():
+    """endpoint to get the projected federal seat count for each party from the latest polling average."""
+    try:
+        predictor = get_predictor()
+    except (OSError, orjson.JSONDecodeError, KeyError, IndexError) as e:
+        print(f"Error loading seat projection data: {e}") # Log error
+        raise HTTPException(status_code=500, detail="Could not load seat projection data.")
+
+    return predictor.project_seats()
 
 @app.get("/api/regions")
 async def get_regions():
     """endpoint to get a list of available region *names*."""
     # Return the list of full names
-    return VALID_REGIONS
+    return Response(_REGIONS_BYTES, media_type="application/json")
 
 
 if __name__ == "__main__":
@@ -169,8 +163,17 @@ if __name__ == "__main__":
 
     # Note: Make sure the data directories/files exist before starting.
     # Consider running scrape_polls.py and aggregate_polls.py manually or via a script first.
-    if not POLLS_DIR.exists() or not AVERAGES_DIR.exists() or not LATEST_DIR.exists():
-        print("\n⚠️ Warning: Data directories (polls, averages, latest) not found.")
+    if not POLLS_DIR.exists() or not AVERAGES_DIR.exists() or not LATEST_DIR.exists() or not TRANSFORMED_DIR.exists():
+        print("\n⚠️ Warning: Data directories (polls, averages, latest, transformed) not found.")
         print("Please run 'python scrape_polls.py' and 'python aggregate_polls.py' first.\n")
 
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    # uvloop and httptools ship with uvicorn[standard]; workers need the app as an import string
+    uvicorn.run(
+        "main:app",
+        app_dir=str(SCRIPT_DIR),
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=os.cpu_count(),
+    ) 
\ No newline at end of file
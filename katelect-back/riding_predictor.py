@@ -1,35 +1,57 @@
-import json
+import orjson
 import numpy as np
+from functools import lru_cache
 from typing import Dict, List, Optional
 from pathlib import Path
 
+# define directories
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR / "data"
+
+# input files of the predictor
+NATIONAL_VOTE_PATH = DATA_DIR / 'results' / 'federal_vote.json'
+RESULTS_PATH = DATA_DIR / 'results' / 'federal_results.json'
+AVERAGES_PATH = DATA_DIR / 'averages' / 'federal_averages.json'
+DISTRICTS_PATH = DATA_DIR / 'districts' / 'federal_districts.json'
+INPUT_PATHS = (NATIONAL_VOTE_PATH, RESULTS_PATH, AVERAGES_PATH, DISTRICTS_PATH)
+
+# party order used for the vote share arrays
+PARTIES = ['LPC', 'CPC', 'NDP', 'BQ', 'GPC', 'PPC', 'Other']
+BQ_INDEX = PARTIES.index('BQ')
+
+@lru_cache(maxsize=8)
+def _parse_json(path: Path, mtime_ns: int):
+    """parse a json file once per modification time"""
+    return orjson.loads(path.read_bytes())
+
+def load_json(path: Path):
+    """load a json file, reusing the parsed data until the file changes"""
+    return _parse_json(path, path.stat().st_mtime_ns)
+
 class RidingPredictor:
     """predicts riding-level results using proportional swing from most recent election"""
     
     def __init__(self) -> None:
         # load national vote shares
-        with open('data/results/federal_vote.json', 'r') as f:
-            self.national_votes = json.load(f)
+        self.national_votes = load_json(NATIONAL_VOTE_PATH)
         
         # load riding-level results
-        with open('data/results/federal_results.json', 'r') as f:
-            self.provinces_data = json.load(f)
+        self.provinces_data = load_json(RESULTS_PATH)
             
         # load latest polling averages
-        with open('data/averages/federal_averages.json', 'r') as f:
-            averages_data = json.load(f)
-            # get the most recent poll
-            latest_poll = averages_data[-1]
-            self.latest_poll_date = latest_poll['date']
-            self.latest_polls = {
-                'LPC': latest_poll['liberal'],
-                'CPC': latest_poll['conservative'],
-                'NDP': latest_poll['ndp'],
-                'BQ': latest_poll['bloc'],
-                'GPC': latest_poll['green'],
-                'PPC': latest_poll['ppc'],
-                'Other': latest_poll['other']
-            }
+        averages_data = load_json(AVERAGES_PATH)
+        # get the most recent poll
+        latest_poll = averages_data[-1]
+        self.latest_poll_date = latest_poll['date']
+        self.latest_polls = {
+            'LPC': latest_poll['liberal'],
+            'CPC': latest_poll['conservative'],
+            'NDP': latest_poll['ndp'],
+            'BQ': latest_poll['bloc'],
+            'GPC': latest_poll['green'],
+            'PPC': latest_poll['ppc'],
+            'Other': latest_poll['other']
+        }
             
         # store the most recent results for each riding
         self.riding_history: Dict[str, Dict[str, float]] = {}
@@ -45,36 +67,32 @@ class RidingPredictor:
         self._process_historical_data()
         
         # load all riding codes
-        with open('data/districts/federal_districts.json', 'r') as f:
-            districts_data = json.load(f)
-            self.all_riding_codes = []
-            for province in districts_data.values():
-                for riding in province:
-                    self.all_riding_codes.append(riding['code'])
+        districts_data = load_json(DISTRICTS_PATH)
+        self.all_riding_codes = []
+        for province in districts_data.values():
+            for riding in province:
+                self.all_riding_codes.append(riding['code'])
     
-    def _normalize_results(self, results: Dict[str, float], is_quebec: bool) -> Dict[str, float]:
-        """normalize results to sum to 100% and handle special cases"""
+    def _normalize_results(self, raw_results: np.ndarray) -> np.ndarray:
+        """normalize results to sum to 100% and handle special cases, one row per riding"""
         # if not quebec, remove BQ
-        if not is_quebec:
-            results['bq'] = 0.0
-            
-        # calculate current total (excluding 'other' as we'll use it for remainder)
-        total = sum(results[p] for p in ['lpc', 'cpc', 'ndp', 'bq', 'gpc', 'ppc'])
-        
+        raw_results[~self._is_quebec, BQ_INDEX] = 0.0
+
+        # calculate current totals (excluding 'other' as we'll use it for remainder)
+        totals = raw_results.sum(axis=1)
+
         # if total exceeds 100%, normalize proportionally
-        if total > 100.0:
-            scale_factor = 100.0 / total
-            for party in ['lpc', 'cpc', 'ndp', 'bq', 'gpc', 'ppc']:
-                results[party] *= scale_factor
-            results['other'] = 0.0
-        else:
-            # assign remainder to 'other'
-            results['other'] = 100.0 - total
-            
-        return results
+        over = totals > 100.0
+        raw_results *= np.where(over, 100.0 / np.where(over, totals, 1.0), 1.0)[:, None]
+
+        # assign remainder to 'other' (nothing is left when the total was scaled down)
+        other = np.where(over, 0.0, 100.0 - totals)
+        return np.column_stack([raw_results, other])
     
     def _process_historical_data(self) -> None:
         """process historical data to get most recent results for each riding"""
+        raw_results = []
+
         # process in reverse chronological order to get most recent first
         for year in ['2021', '2019']:
             for province, ridings in self.provinces_data.items():
@@ -85,19 +103,10 @@ class RidingPredictor:
                     if riding_code not in self.riding_names:
                         self.riding_names[riding_code] = riding['name']
                     
-                    if year in riding['results'] and riding_code not in self.riding_history:
+                    if year in riding['results'] and riding_code not in self.riding_latest_year:
                         # get raw results, defaulting to 0 for missing parties
-                        results = {
-                            party.lower(): riding['results'][year].get(party.lower(), 0)
-                            for party in ['LPC', 'CPC', 'NDP', 'BQ', 'GPC', 'PPC', 'Other']
-                        }
-                        
-                        # normalize results
-                        is_quebec = riding_code.startswith('24')
-                        normalized_results = self._normalize_results(results, is_quebec)
-                        
-                        # store normalized results
-                        self.riding_history[riding_code] = normalized_results
+                        # ('other' is left out as it is recomputed as the remainder)
+                        raw_results.append([riding['results'][year].get(party.lower(), 0) for party in PARTIES[:-1]])
                         self.riding_latest_year[riding_code] = year
                         
                         # if this is our first riding from this year, store national results
@@ -106,81 +115,92 @@ class RidingPredictor:
                                 party: self.national_votes[year][party]
                                 for party in ['LPC', 'CPC', 'NDP', 'BQ', 'GPC', 'PPC', 'Other']
                             }
+
+        # store the data as arrays (one row per riding, one column per party)
+        # so every riding can be normalized and predicted at once
+        self._codes = np.array(list(self.riding_latest_year))
+        self._code_index = {code: i for i, code in enumerate(self.riding_latest_year)}
+        self._is_quebec = np.char.startswith(self._codes, '24')
+        self._history = self._normalize_results(
+            np.array(raw_results, dtype=np.float64).reshape(len(self._codes), len(PARTIES) - 1)
+        )
+        self._old_national = np.array([self.most_recent_national.get(party, 0.0) for party in PARTIES], dtype=np.float64)
+
+        # store normalized results
+        for riding_code, results in zip(self.riding_latest_year, self._history.tolist()):
+            self.riding_history[riding_code] = dict(zip((party.lower() for party in PARTIES), results))
     
+    def _apply_swing(self, rows: slice | np.ndarray, national_polls: np.ndarray) -> np.ndarray:
+        """apply proportional swing to the selected riding rows, returning normalized vote shares"""
+        # calculate swing ratio (how much each party's support has changed nationally)
+        old_national = self._old_national
+        swing = np.where(
+            old_national == 0,
+            (national_polls > 0).astype(np.float64),
+            national_polls / np.where(old_national == 0, 1.0, old_national),
+        )
+
+        # apply swing to each riding's result
+        predictions = self._history[rows] * swing
+
+        # handle BQ for non-Quebec ridings
+        predictions[~self._is_quebec[rows], BQ_INDEX] = 0.0
+
+        # normalize to ensure total is 100%
+        totals = predictions.sum(axis=1, keepdims=True)
+        return np.where(totals > 0, predictions / np.where(totals > 0, totals, 1.0) * 100.0, predictions)
+
+    def predict_all(self, national_polls: np.ndarray) -> np.ndarray:
+        """predict results for every riding at once, returning an array of shape (n_ridings, n_parties)"""
+        return self._apply_swing(slice(None), national_polls)
+
     def predict(self, riding_code: str, national_polls: Dict[str, float]) -> Dict[str, float]:
         """predict riding-level results using proportional swing from most recent election"""
-        if riding_code not in self.riding_history:
+        if riding_code not in self._code_index:
             raise ValueError(f"No historical data available for riding {riding_code}")
-        
-        # get the riding's most recent results
-        riding_results = self.riding_history[riding_code]
-        is_quebec = riding_code.startswith('24')
-        
-        predictions = {}
-        total = 0.0  # track total for normalization
-        
-        # calculate swing for each party
-        for party in ['LPC', 'CPC', 'NDP', 'BQ', 'GPC', 'PPC', 'Other']:
-            party_lower = party.lower()
-            
-            # handle BQ for non-Quebec ridings
-            if party == 'BQ' and not is_quebec:
-                predictions[party] = 0.0
-                continue
-            
-            # get national values
-            old_national = self.most_recent_national[party]
-            new_national = national_polls[party]
-            
-            # calculate swing ratio (how much the party's support has changed nationally)
-            if old_national == 0:
-                swing_ratio = 1.0 if new_national > 0 else 0.0
-            else:
-                swing_ratio = new_national / old_national
-            
-            # apply swing to riding's result
-            prediction = riding_results[party_lower] * swing_ratio
-            predictions[party] = prediction
-            total += prediction
-        
-        # normalize to ensure total is 100%
-        if total > 0:
-            for party in predictions:
-                predictions[party] = (predictions[party] / total) * 100.0
-        
-        return predictions
+
+        new_national = np.array([national_polls[party] for party in PARTIES], dtype=np.float64)
+        row = self._code_index[riding_code]
+        predictions = self._apply_swing(slice(row, row + 1), new_national)[0]
+        return dict(zip(PARTIES, predictions.tolist()))
+
+    def project_seats(self, national_polls: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """count the projected winner of every riding in the district list (defaults to the latest polling average)"""
+        if national_polls is None:
+            national_polls = np.array([self.latest_polls[party] for party in PARTIES], dtype=np.float64)
+
+        # only count ridings from the district list that have historical data
+        rows = [self._code_index[code] for code in self.all_riding_codes if code in self._code_index]
+
+        # determine winner (party with highest vote share) and tally seats
+        winners = np.argmax(self.predict_all(national_polls)[rows], axis=1)
+        return dict(zip(PARTIES, np.bincount(winners, minlength=len(PARTIES)).tolist()))
+
+@lru_cache(maxsize=1)
+def _load_predictor(mtimes_ns: tuple) -> RidingPredictor:
+    """build the predictor once per set of input file modification times"""
+    return RidingPredictor()
+
+def get_predictor() -> RidingPredictor:
+    """return the shared predictor, rebuilding it when any of its input files changes"""
+    return _load_predictor(tuple(path.stat().st_mtime_ns for path in INPUT_PATHS))
 
 if __name__ == '__main__':
     # initialize predictor
     predictor = RidingPredictor()
     
-    # track seat counts and close races
-    seat_counts = {
-        'LPC': 0,
-        'CPC': 0,
-        'NDP': 0,
-        'BQ': 0,
-        'GPC': 0,
-        'PPC': 0,
-        'Other': 0
-    }
-    
     print(f"\nLatest National Polling Averages (as of {predictor.latest_poll_date}):")
     for party, support in sorted(predictor.latest_polls.items(), key=lambda x: x[1], reverse=True):
         print(f"{party}: {support:.1f}%")
     
-    # predict results for all ridings
+    # warn about ridings that can't be predicted
     for riding_code in predictor.all_riding_codes:
-        try:
-            predictions = predictor.predict(riding_code, predictor.latest_polls)
-            
-            # determine winner (party with highest vote share)
-            winner = max(predictions.items(), key=lambda x: x[1])[0]
-            seat_counts[winner] += 1
-            
-        except ValueError as e:
-            print(f"Warning: Could not predict {riding_code}: {e}")
-    
+        if riding_code not in predictor.riding_history:
+            print(f"Warning: Could not predict {riding_code}: No historical data available for riding {riding_code}")
+
+    # predict results for all ridings at once and tally seats
+    seat_counts = predictor.project_seats()
+
     # print final seat counts
     total_seats = sum(seat_counts.values())
     print("\nSeat Projections:")
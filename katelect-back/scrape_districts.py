@@ -1,7 +1,6 @@
-import json
+import orjson
 import os
-from bs4 import BeautifulSoup
-import re
+from lxml import html as lh
 
 def clean_text(text: str) -> str:
     """
@@ -13,18 +12,16 @@ def clean_text(text: str) -> str:
     returns:
         cleaned text
     """
-    # remove extra whitespace including non-breaking spaces
-    text = re.sub(r'\s+', ' ', text).strip()
-    # replace specific html entities if bs4 didn't catch them
-    text = text.replace('&nbsp;', ' ')
-    return text.strip()
+    # replace specific html entities if lxml didn't catch them, then collapse
+    # whitespace (str.split also splits on decoded non-breaking spaces)
+    return ' '.join(text.replace('&nbsp;', ' ').split())
 
-def extract_district_data(soup: BeautifulSoup) -> dict[str, list[dict[str, str]]]:
+def extract_district_data(doc: lh.HtmlElement) -> dict[str, list[dict[str, str]]]:
     """
-    extract electoral district data from the soup object.
+    extract electoral district data from the parsed html document.
 
     args:
-        soup: beautifulsoup object of the html page
+        doc: lxml root element of the html page
 
     returns:
         a dictionary where keys are province/territory names
@@ -32,44 +29,44 @@ def extract_district_data(soup: BeautifulSoup) -> dict[str, list[dict[str, str]]
     """
     districts_by_province: dict[str, list[dict[str, str]]] = {}
     # find all tables containing district data
-    tables = soup.find_all("table", class_="widthFull tableau")
+    tables = doc.xpath('//table[@class="widthFull tableau"]')
 
     for table in tables:
         caption_tag = table.find("caption")
-        if not caption_tag or not caption_tag.get("id"):
+        if caption_tag is None or not caption_tag.get("id"):
             print("warning: skipping table without a caption or caption id.")
             continue
 
-        province_name = clean_text(caption_tag.get_text())
+        province_name = clean_text(caption_tag.text_content())
         districts_by_province[province_name] = []
 
         tbody = table.find("tbody")
-        if not tbody:
+        if tbody is None:
             print(f"warning: no tbody found for table under caption '{province_name}'.")
             continue
 
         # find all data rows (tr) skipping the header row (th)
-        rows = tbody.find_all("tr")
+        rows = tbody.xpath('.//tr')
         if not rows:
             print(f"warning: no rows found in tbody for table under caption '{province_name}'.")
             continue
 
-        header_row = rows[0].find_all("th")
+        header_row = rows[0].xpath('.//th')
         if not header_row:
              print(f"warning: no header row (th) found for table under caption '{province_name}'.")
              continue # skip if no header
 
         for tr in rows[1:]:  # skip header row
-            cells = tr.find_all("td")
+            cells = tr.xpath('.//td')
             if len(cells) == 2:  # expect code and name
-                code = clean_text(cells[0].get_text())
-                name = clean_text(cells[1].get_text())
+                code = clean_text(cells[0].text_content())
+                name = clean_text(cells[1].text_content())
                 if code and name: # ensure data is present
                      districts_by_province[province_name].append({"code": code, "name": name})
                 else:
-                    print(f"warning: skipping row with missing code or name in {province_name}: {tr}")
+                    print(f"warning: skipping row with missing code or name in {province_name}: {lh.tostring(tr, encoding='unicode').strip()}")
             else:
-                 print(f"warning: skipping row with unexpected cell count in {province_name}: {tr}")
+                 print(f"warning: skipping row with unexpected cell count in {province_name}: {lh.tostring(tr, encoding='unicode').strip()}")
 
 
     return districts_by_province
@@ -86,8 +83,8 @@ os.makedirs(output_dir, exist_ok=True)
 # read the html file
 print(f"reading html file from {html_file_path}...")
 try:
-    # use utf-8 encoding as the content appears to be utf-8 despite the meta tag
-    with open(html_file_path, "r", encoding="utf-8") as f:
+    # read raw bytes and let lxml decode them
+    with open(html_file_path, "rb") as f:
         html_content = f.read()
 except FileNotFoundError:
     print(f"error: html file not found at {html_file_path}")
@@ -95,14 +92,15 @@ except FileNotFoundError:
 
 # parse html and extract data
 print("Parsing html and extracting district data...")
-soup = BeautifulSoup(html_content, "html.parser")
-district_data = extract_district_data(soup)
+# use utf-8 encoding as the content appears to be utf-8 despite the meta tag
+doc = lh.fromstring(html_content, parser=lh.HTMLParser(encoding="utf-8"))
+district_data = extract_district_data(doc)
 
 # write data to json file
 print(f"💾 Saving district data to {output_path}...")
 try:
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(district_data, f, indent=2, ensure_ascii=False)
+    with open(output_path, "wb") as f:
+        f.write(orjson.dumps(district_data, option=orjson.OPT_INDENT_2))
 
     # calculate counts for the final message
     num_provinces = len(district_data)
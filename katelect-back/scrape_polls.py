@@ -1,6 +1,8 @@
-import requests
-from bs4 import BeautifulSoup
-import json
+import aiohttp
+import asyncio
+from collections import namedtuple
+from lxml import etree
+import orjson
 import os
 import re
 
@@ -15,6 +17,18 @@ urls = {
     "bc": "https://338canada.com/polls-bc.htm",
 }
 
+# bytes read from the response per parser feed
+CHUNK_SIZE = 65536
+
+# retries for failed downloads, with exponential backoff between attempts
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5 # seconds
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# notes stripped from cells: "(1/3)"-style counters and asterisk footnotes
+_PAREN_RE = re.compile(r'\s*\(\d+/\d+\)')
+_STAR_RE = re.compile(r'\*+.*$')
+
 def clean_text(text: str) -> str:
     """
     clean text by removing extra whitespace and unwanted characters
@@ -27,69 +41,197 @@ def clean_text(text: str) -> str:
     """
     # remove extra whitespace
     text = ' '.join(text.split())
+
+    # most cells have no notes, so skip both regex passes for them
+    if '(' not in text and '*' not in text:
+        return text
     
     # remove text in parentheses with numbers (e.g., "(1/3)")
-    text = re.sub(r'\s*\(\d+/\d+\)', '', text)
+    text = _PAREN_RE.sub('', text)
     
     # remove asterisks and their following text
-    text = re.sub(r'\*+.*$', '', text)
+    text = _STAR_RE.sub('', text)
     
     return text.strip()
 
-def extract_poll_table(soup):
+# rows are kept as plain tuples sharing one header list; they only become
+# dictionaries keyed by header when written out
+PollTable = namedtuple("PollTable", ["headers", "rows"])
+
+class PollTableExtractor:
     """
-    extract polling data from the table
-    
-    args:
-        soup: beautifulsoup object of the page
-        
-    returns:
-        list of dictionaries containing poll data
+    lxml parser target that keeps only the text of the poll table's cells while
+    the page is streamed in, discarding the rest of the document.
     """
-    table = soup.find("table", {"id": "myTable"})
-    if not table:
-        return []
 
-    # get headers and clean them
-    headers = [clean_text(th.get_text()) for th in table.find_all("th")]
+    def __init__(self, table_id: str = "myTable") -> None:
+        self.table_id = table_id
+        self.table_depth = 0 # nesting depth of tables inside the poll table (0 = outside it)
+        self.done = False # set once the poll table has been closed
+        self.headers: list[str] = []
+        self.rows: list[list[str]] = []
+        self.row_count = 0
+        self.cells: list[str] = []
+        self.cell_tag: str | None = None # th or td while inside a cell
+        self.cell_depth = 0
+        self.cell_text: list[str] = []
+
+    def start(self, tag: str, attrib: dict) -> None:
+        if self.done:
+            return
+        if self.table_depth == 0:
+            if tag == "table" and attrib.get("id") == self.table_id:
+                self.table_depth = 1
+            return
+
+        if self.cell_tag is not None:
+            # nested element inside a cell, its text belongs to the cell
+            self.cell_depth += 1
+        elif tag == "table":
+            self.table_depth += 1
+        elif tag == "tr":
+            self.row_count += 1
+            self.cells = []
+        elif tag in ("th", "td"):
+            self.cell_tag = tag
+            self.cell_text = []
+
+    def end(self, tag: str) -> None:
+        if self.done or self.table_depth == 0:
+            return
 
-    rows = []
-    for tr in table.find_all("tr")[1:]:  # skip header row
-        cells = [td.get_text() for td in tr.find_all("td")]
-        if len(cells) == len(headers):
-            # clean each cell's text
-            cleaned_cells = [clean_text(cell) for cell in cells]
-            row = dict(zip(headers, cleaned_cells))
-            rows.append(row)
+        if self.cell_tag is not None:
+            if self.cell_depth > 0:
+                self.cell_depth -= 1
+                return
+            # end of the cell: headers are cleaned now, data cells when the row is kept
+            if self.cell_tag == "th":
+                self.headers.append(clean_text(''.join(self.cell_text)))
+            else:
+                self.cells.append(''.join(self.cell_text))
+            self.cell_tag = None
+            return
 
-    return rows
+        if tag == "tr" and self.row_count > 1: # skip header row
+            self.rows.append(self.cells)
+        elif tag == "table":
+            self.table_depth -= 1
+            self.done = self.table_depth == 0
+
+    def data(self, text: str) -> None:
+        if self.cell_tag is not None:
+            self.cell_text.append(text)
+
+    def close(self) -> PollTable:
+        """
+        build the poll rows once parsing has finished
+
+        returns:
+            the table headers and one tuple of cleaned cells per poll
+        """
+        rows = []
+        for cells in self.rows:
+            if len(cells) == len(self.headers):
+                # clean each cell's text
+                rows.append(tuple(clean_text(cell) for cell in cells))
+        return PollTable(self.headers, rows)
 
 # Create output directory path (relative to script location)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 output_dir = os.path.join(script_dir, "data", "polls")
 os.makedirs(output_dir, exist_ok=True)
 
-# Scrape and write each region to a separate file
-for region, url in urls.items():
-    print(f"🔍 Scraping {region} polls from {url}...")
-    
-    # set proper headers for the request
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Charset': 'UTF-8',
-    }
-    
-    res = requests.get(url, headers=headers)
-    res.encoding = 'utf-8'  # force utf-8 encoding
-    
-    soup = BeautifulSoup(res.text, "html.parser")
-    data = extract_poll_table(soup)
+# set proper headers for the request
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Charset': 'UTF-8',
+    'Accept-Encoding': 'gzip, br, deflate', # compressed pages (br is decoded by brotli)
+}
+
+async def read_poll_table(res: aiohttp.ClientResponse) -> PollTable:
+    """
+    extract polling data from the table, feeding the parser each chunk as it
+    arrives and stopping the download as soon as the table has been read
 
+    args:
+        res: response for a region's polls page
+
+    returns:
+        the table headers and one tuple of cleaned cells per poll
+    """
+    extractor = PollTableExtractor()
+    parser = etree.HTMLParser(target=extractor, encoding="utf-8")
+    async for chunk in res.content.iter_chunked(CHUNK_SIZE):
+        parser.feed(chunk)
+        if extractor.done:
+            break
+    return parser.close()
+
+def save_region_polls(region: str, table: PollTable) -> str:
+    """
+    write a region's poll table to its json file
+
+    args:
+        region: region code used in the output file name
+        table: the poll table read from the region's page
+
+    returns:
+        path of the written json file
+    """
+    headers, rows = table
+    data = [dict(zip(headers, row)) for row in rows]
+
+    # write to a temporary file first so a crash mid-write can't corrupt the json
     output_path = os.path.join(output_dir, f"polls_{region}.json")
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    os.replace(tmp_path, output_path)
 
+    return output_path
+
+async def fetch(session: aiohttp.ClientSession, region: str, url: str) -> bool:
+    """
+    download and parse a region's polls page, retrying transient failures, then
+    save it off the event loop. the saved file is left untouched if every attempt fails.
+
+    returns:
+        whether the region's polls were saved
+    """
+    print(f"🔍 Scraping {region} polls from {url}...")
+
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            async with session.get(url) as res:
+                res.raise_for_status() # an error page would otherwise be saved as an empty poll list
+                table = await read_poll_table(res)
+            break
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            retryable = not isinstance(e, aiohttp.ClientResponseError) or e.status in RETRY_STATUSES
+            if not retryable or attempt == MAX_RETRIES:
+                print(f"error fetching {region} polls from {url}: {e}")
+                return False
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    loop = asyncio.get_running_loop()
+    output_path = await loop.run_in_executor(None, save_region_polls, region, table)
     print(f"Saved {region} polls to {output_path}")
+    return True
+
+async def main() -> list[bool]:
+    """scrape all regions concurrently over one pooled session, returning whether each was saved"""
+    async with aiohttp.ClientSession(
+        headers=headers,
+        connector=aiohttp.TCPConnector(limit=8),
+        timeout=aiohttp.ClientTimeout(total=20),
+    ) as session:
+        return await asyncio.gather(*(fetch(session, region, url) for region, url in urls.items()))
+
+# Scrape and write each region to a separate file
+saved = asyncio.run(main())
 
-print("\nAll regions scraped and saved.")
+if all(saved):
+    print("\nAll regions scraped and saved.")
+else:
+    print(f"\n{saved.count(False)} of {len(saved)} regions could not be scraped, their previous polls were kept.")
@@ -1,9 +1,19 @@
+import argparse
 import requests
-from bs4 import BeautifulSoup
-import json
+from lxml import etree
+import numpy as np
+from http_session import create_session
+import orjson
 import os
-import time
 import re
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import logging
+from tqdm import tqdm
+from tqdm.contrib.logging import logging_redirect_tqdm
+
+logger = logging.getLogger(__name__)
 
 # path to the input districts file
 districts_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "districts", "federal_districts.json")
@@ -13,22 +23,73 @@ output_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "r
 os.makedirs(output_dir, exist_ok=True)
 output_file_path = os.path.join(output_dir, "federal_results.json")
 
+# line-delimited checkpoint of finished districts, used to resume an interrupted run
+checkpoint_file_path = os.path.join(output_dir, "federal_results.ndjson")
+
 # parties to look for
-PARTIES = ["lpc", "cpc", "ndp", "bq", "gpc", "ppc"]
+PARTIES = frozenset(("lpc", "cpc", "ndp", "bq", "gpc", "ppc"))
+
+# number inside a percentage like "<1" or ">99"
+_NUM_RE = re.compile(r'(\d+(\.\d+)?)')
+
+# x coordinates of the party, 2019 and 2021 columns in the results svg.
+# these coordinates might need adjustment if the site layout changes.
+PARTY_X_COORD = 32.0
+YEAR_X_COORDS = {"2019": 96.0, "2021": 160.0}
+COORD_TOLERANCE = 5.0 # tolerance for matching x coordinates
+
+# open (low, high) x ranges of each column, precomputed from the coordinates and tolerance
+PARTY_X_RANGE = (PARTY_X_COORD - COORD_TOLERANCE, PARTY_X_COORD + COORD_TOLERANCE)
+YEAR_X_RANGES = {year: (x - COORD_TOLERANCE, x + COORD_TOLERANCE) for year, x in YEAR_X_COORDS.items()}
+
+# html parser reused across pages; lxml parsers can't be shared between threads,
+# so each worker thread gets its own
+_parser_local = threading.local()
+
+def _get_parser() -> etree.HTMLParser:
+    """return the calling thread's html parser, creating it on first use."""
+    parser = getattr(_parser_local, "parser", None)
+    if parser is None:
+        parser = etree.HTMLParser(encoding="utf-8", remove_blank_text=True, recover=True)
+        _parser_local.parser = parser
+    return parser
+
+# concurrent district downloads and the overall request rate they share
+MAX_WORKERS = 12
+REQUESTS_PER_SECOND = 8
+
+# districts appended to the checkpoint between flushes
+CHECKPOINT_FLUSH_EVERY = 32
+
+# district results only change after an election, so reuse cached pages for a day
+CACHE_EXPIRE_SECONDS = 86400
 
+# pages repeat the same few strings ("50.0%", "<1%"), so the parsed values are memoized
+@lru_cache(maxsize=None)
 def clean_percentage(text: str) -> float | None:
     """
     clean percentage text and convert to float.
     handles formats like "47.3%", "<1%", ">99%".
     returns none if text is not a valid percentage or is 0.0%.
     """
-    text = text.strip().lower().replace('%', '')
+    # fast path: a plain number like "47.3%" parses once the trailing % is dropped
+    text = text.strip()
+    number = text[:-1] if text.endswith('%') else text
+    try:
+        value = float(number)
+        # return none if the value is effectively zero, as 338 often omits 0%
+        return value if value > 0.0 else None
+    except ValueError:
+        pass
+
+    # rare path: "<1%", ">99%" and anything else float() can't read directly
+    text = text.lower().replace('%', '')
     if '<' in text or '>' in text:
         # for simplicity, treat <1 as 0.5 and >99 as 99.5, though this might not be accurate
         # for vote share, <1% likely means close to 0, and >99% is rare.
         # adjust logic if specific handling is needed. consider returning 0 or a special value.
         # for now, we'll try to extract the number, or return a small/large value.
-        num_part = re.search(r'(\d+(\.\d+)?)', text)
+        num_part = _NUM_RE.search(text)
         if num_part:
              val = float(num_part.group(1))
              return 0.1 if '<' in text else 99.9 # return small/large value or None? let's use 0.1 / 99.9
@@ -40,156 +101,290 @@ def clean_percentage(text: str) -> float | None:
     except ValueError:
         return None
 
-def extract_district_results(soup: BeautifulSoup) -> dict | None:
+def _text_of(elem: etree._Element) -> str:
+    """join an element's text fragments, stripping each one (like bs4's get_text(strip=True))."""
+    return ''.join(fragment.strip() for fragment in elem.itertext())
+
+def _to_float(value: str) -> float:
+    """convert a coordinate attribute to float, using nan for invalid values."""
+    try:
+        return float(value)
+    except ValueError:
+        return np.nan
+
+class DistrictResultsExtractor:
     """
-    extract 2019 and 2021 election results from the svg table on a district page.
-    
-    args:
-        soup: beautifulsoup object of the district page.
-        
-    returns:
-        a dictionary with results like {"2019": {"lpc": 47.3, ...}, "2021": {"lpc": 50.9, ...}} or none if table not found.
+    extracts election results from the results svg of district pages, holding
+    the compiled xpaths, column ranges and party names shared by every page.
     """
-    svg = soup.find("svg", id=lambda x: x and x.startswith('ridinghisto-'))
-    if not svg:
-        print("    warning: could not find results svg.")
-        return None
 
-    texts = svg.find_all("text")
-    results = {"2019": {}, "2021": {}}
-    
-    # find elements based roughly on x coordinates typical for party, 2019 val, 2021 val
-    # these coordinates might need adjustment if the site layout changes.
-    party_x_coord = 32.0
-    year_2019_x_coord = 96.0
-    year_2021_x_coord = 160.0
-    coord_tolerance = 5.0 # tolerance for matching x coordinates
-
-    party_elements = {} # store potential party elements by their y-coordinate
-
-    # first pass: identify potential party labels and their y-coordinates
-    for text_elem in texts:
-        try:
-            x = float(text_elem.get('x', -1))
-            y = float(text_elem.get('y', -1))
-            party_name = text_elem.get_text(strip=True).lower()
-
-            if abs(x - party_x_coord) < coord_tolerance and party_name in PARTIES:
-                 # round y to handle minor variations
-                party_elements[round(y)] = party_name
-        except (ValueError, AttributeError):
-            continue # skip elements without valid coordinates
-
-    # second pass: find percentages matching the y-coordinate of identified parties
-    for text_elem in texts:
-        try:
-            x = float(text_elem.get('x', -1))
-            y = float(text_elem.get('y', -1))
-            text_content = text_elem.get_text(strip=True)
-            
-            rounded_y = round(y)
-            
-            if rounded_y in party_elements:
-                party = party_elements[rounded_y]
-                percentage = clean_percentage(text_content)
-                
+    def __init__(self) -> None:
+        # the results svg and its positioned text elements
+        self.svg_xpath = etree.XPath('//svg[starts-with(@id, "ridinghisto-")]')
+        self.texts_xpath = etree.XPath('.//text[@x and @y]')
+        self.parties = PARTIES
+        self.party_x_range = PARTY_X_RANGE
+        self.year_x_ranges = YEAR_X_RANGES
+
+    def extract(self, doc: etree._Element) -> dict | None:
+        """
+        extract 2019 and 2021 election results from the svg table on a district page.
+
+        args:
+            doc: lxml root element of the district page.
+
+        returns:
+            a dictionary with results like {"2019": {"lpc": 47.3, ...}, "2021": {"lpc": 50.9, ...}} or none if table not found.
+        """
+        svgs = self.svg_xpath(doc)
+        if not svgs:
+            logger.warning("could not find results svg.")
+            return None
+        svg = svgs[0]
+
+        results = {year: {} for year in self.year_x_ranges}
+
+        # coordinates of all text elements as arrays, skipping elements without valid coordinates
+        texts = self.texts_xpath(svg)
+        xs = np.fromiter((_to_float(text_elem.get('x')) for text_elem in texts), dtype=np.float64, count=len(texts))
+        ys = np.fromiter((_to_float(text_elem.get('y')) for text_elem in texts), dtype=np.float64, count=len(texts))
+        valid_y = ~np.isnan(ys)
+        # round y to handle minor variations
+        y_keys = np.round(np.where(valid_y, ys, 0.0)).astype(np.int64)
+
+        party_elements = {} # store potential party elements by their y-coordinate
+
+        # first pass: identify party labels in the party column and their y-coordinates
+        low, high = self.party_x_range
+        party_mask = valid_y & (xs > low) & (xs < high)
+        for i in np.flatnonzero(party_mask):
+            party_name = _text_of(texts[i]).lower()
+            if party_name in self.parties:
+                party_elements[int(y_keys[i])] = party_name
+
+        # second pass: find percentages in each year's column matching the y-coordinate of identified parties
+        for year, (low, high) in self.year_x_ranges.items():
+            year_mask = valid_y & (xs > low) & (xs < high)
+            for i in np.flatnonzero(year_mask):
+                party = party_elements.get(int(y_keys[i]))
+                if party is None:
+                    continue
+
+                percentage = clean_percentage(_text_of(texts[i]))
                 if percentage is not None:
-                    if abs(x - year_2019_x_coord) < coord_tolerance:
-                        results["2019"][party] = percentage
-                    elif abs(x - year_2021_x_coord) < coord_tolerance:
-                        results["2021"][party] = percentage
-                        
-        except (ValueError, AttributeError):
-            continue # skip elements without valid coordinates or text
-
-    # return none if no results were found
-    if not results["2019"] and not results["2021"]:
-        print("    warning: extracted results are empty.")
-        return None
-        
-    return results
+                    results[year][party] = percentage
+
+        # return none if no results were found
+        if not any(results.values()):
+            logger.warning("extracted results are empty.")
+            return None
+
+        return results
+
+# one extractor for all pages; its xpaths are safe to share between threads
+extract_district_results = DistrictResultsExtractor().extract
 
 
 # load district data
 try:
-    with open(districts_file_path, 'r', encoding='utf-8') as f:
-        all_districts_data = json.load(f)
+    with open(districts_file_path, 'rb') as f:
+        all_districts_data = orjson.loads(f.read())
 except FileNotFoundError:
     print(f"error: districts file not found at {districts_file_path}")
     exit(1)
-except json.JSONDecodeError:
+except orjson.JSONDecodeError:
     print(f"error: could not decode json from {districts_file_path}")
     exit(1)
 
-# prepare structure for results
-results_data = {}
-
 # standard headers
 request_headers = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
     'Accept-Charset': 'UTF-8', # specify utf-8
+    'Accept-Encoding': 'gzip, br, deflate', # compressed pages (br is decoded by brotli)
     'Accept-Language': 'en-US,en;q=0.5', # added language preference
 }
 
+# one session for all districts so the connection to the host is reused;
+# cached pages skip both the network and the rate limit
+session = create_session(request_headers, expire_after=CACHE_EXPIRE_SECONDS, requests_per_second=REQUESTS_PER_SECOND)
+
+def fetch_district(province: str, district: dict) -> tuple[str, dict]:
+    """
+    scrape the results for a single district.
+
+    args:
+        province: name of the province the district belongs to.
+        district: district dictionary with 'code' and 'name'.
+
+    returns:
+        the province and a copy of the district with its "results" added
+        (empty if the page could not be fetched or parsed).
+    """
+    code = district["code"]
+    name = district["name"]
+    url = f"https://338canada.com/{code}e.htm"
+    district_data_with_results = district.copy() # create a copy to avoid modifying original
+
+    try:
+        # get request
+        res = session.get(url, timeout=20)
+        res.raise_for_status() # raise an exception for bad status codes
+
+        # hand the raw bytes to this thread's lxml parser, forcing utf-8
+        doc = etree.fromstring(res.content, _get_parser())
+        
+        # extract results
+        district_results = extract_district_results(doc)
+
+        # add results to the district data
+        district_data_with_results["results"] = district_results if district_results else {} # add empty dict if none
+
+    except requests.exceptions.RequestException as e:
+        logger.error(f"error fetching {url}: {e}")
+        # add district with empty results on error
+        district_data_with_results["results"] = {}
+    except Exception as e:
+        logger.error(f"unexpected error processing {name} ({code}): {e}")
+        # add district with empty results on unexpected error
+        district_data_with_results["results"] = {}
+
+    return province, district_data_with_results
+
+def load_checkpoint() -> dict[str, dict]:
+    """
+    load districts already scraped by an interrupted run. districts whose
+    scrape failed (empty results) are left out so they are tried again.
+
+    returns:
+        a dictionary of district code to district with results.
+    """
+    scraped = {}
+    if not os.path.exists(checkpoint_file_path):
+        return scraped
+
+    with open(checkpoint_file_path, "rb") as f:
+        for line in f:
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue # partial line left by a crash mid-write
+            if entry["district"].get("results"):
+                scraped[entry["district"]["code"]] = entry["district"]
+
+    print(f"resuming from {checkpoint_file_path}: {len(scraped)} districts already scraped")
+    return scraped
+
+def load_prior_results() -> dict[str, dict]:
+    """
+    load the results saved by the last complete run.
+
+    returns:
+        a dictionary of district code to its saved results (empty if there is no saved file).
+    """
+    try:
+        with open(output_file_path, "rb") as f:
+            prior_data = orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except orjson.JSONDecodeError:
+        logger.warning(f"could not decode json from {output_file_path}, scraping every district")
+        return {}
+
+    prior = {
+        district["code"]: district.get("results") or {}
+        for districts in prior_data.values()
+        for district in districts
+    }
+    print(f"loaded saved results from {output_file_path}: {sum(map(bool, prior.values()))} districts with results")
+    return prior
+
+arg_parser = argparse.ArgumentParser(description="scrape 2019 and 2021 riding results from 338canada.")
+arg_parser.add_argument("--force", action="store_true", help="re-scrape districts that already have saved results")
+args = arg_parser.parse_args()
+
+# warnings and errors go through logging so they print above the progress bar
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
 total_districts = sum(len(districts) for districts in all_districts_data.values())
-processed_count = 0
-
-# iterate through provinces and districts
-for province, districts in all_districts_data.items():
-    print(f"processing province: {province}")
-    results_data[province] = []
-    for district in districts:
-        processed_count += 1
-        code = district.get("code")
-        name = district.get("name")
-        if not code or not name:
-            print(f"    skipping invalid district entry: {district}")
-            continue
-
-        url = f"https://338canada.com/{code}e.htm"
-        print(f"  ({processed_count}/{total_districts}) scraping district: {name} ({code}) from {url}...")
-
-        try:
-            # get request
-            res = requests.get(url, headers=request_headers, timeout=20)
-            res.raise_for_status() # raise an exception for bad status codes
-            res.encoding = 'utf-8' # ensure correct encoding
-
-            soup = BeautifulSoup(res.text, "html.parser")
-            
-            # extract results
-            district_results = extract_district_results(soup)
-
-            # add results to the district data
-            district_data_with_results = district.copy() # create a copy to avoid modifying original
-            district_data_with_results["results"] = district_results if district_results else {} # add empty dict if none
-            results_data[province].append(district_data_with_results)
-
-            # polite delay
-            time.sleep(0.5) # wait half a second between requests
-
-        except requests.exceptions.RequestException as e:
-            print(f"    error fetching {url}: {e}")
-            # add district with empty results on error? or skip? let's add with empty.
-            district_data_with_results = district.copy()
-            district_data_with_results["results"] = {}
-            results_data[province].append(district_data_with_results)
-            time.sleep(1) # longer delay after error
-        except Exception as e:
-            print(f"    unexpected error processing {name} ({code}): {e}")
-            # add district with empty results on unexpected error
-            district_data_with_results = district.copy()
-            district_data_with_results["results"] = {}
-            results_data[province].append(district_data_with_results)
-            time.sleep(1)
-
-# save the results to json
+
+# districts finished by an interrupted run are not scraped again
+scraped_districts = load_checkpoint()
+
+# districts with results from the last complete run are carried forward unless --force is given
+prior_results = {} if args.force else load_prior_results()
+
+with open(checkpoint_file_path, "ab") as checkpoint, ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    # start on a fresh line if a crash cut the last record short
+    if checkpoint.tell() > 0:
+        with open(checkpoint_file_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                checkpoint.write(b"\n")
+
+    futures = []
+    for province, districts in all_districts_data.items():
+        for district in districts:
+            code = district.get("code")
+            if not code or not district.get("name"):
+                logger.warning(f"skipping invalid district entry: {district}")
+                continue
+            if code in scraped_districts:
+                continue
+            if prior_results.get(code):
+                scraped_districts[code] = {**district, "results": prior_results[code]}
+                continue
+
+            futures.append(executor.submit(fetch_district, province, district))
+
+    def record_district(future) -> None:
+        """store a finished district and append it to the checkpoint."""
+        province, district_data_with_results = future.result()
+        scraped_districts[district_data_with_results["code"]] = district_data_with_results
+        checkpoint.write(orjson.dumps({"province": province, "district": district_data_with_results}) + b"\n")
+
+    # append each district to the checkpoint as it completes, flushing in batches;
+    # skipped and already scraped districts start the progress bar off
+    pending = set(futures)
+    try:
+        with logging_redirect_tqdm(), tqdm(total=total_districts, initial=total_districts - len(futures), unit="district") as progress:
+            for written, future in enumerate(as_completed(futures), start=1):
+                pending.discard(future)
+                record_district(future)
+                if written % CHECKPOINT_FLUSH_EVERY == 0:
+                    checkpoint.flush()
+                progress.update(1)
+    except KeyboardInterrupt:
+        # drop the queued districts instead of downloading them all before exiting,
+        # and checkpoint the ones that finished so the next run resumes from them
+        executor.shutdown(wait=True, cancel_futures=True)
+        for future in pending:
+            if future.done() and not future.cancelled():
+                record_district(future)
+        checkpoint.flush()
+        print(f"\ninterrupted, progress saved to {checkpoint_file_path}. run again to resume.")
+        raise SystemExit(1)
+
+# rebuild the nested structure in the original province and district order
+results_data = {
+    province: [
+        scraped_districts[district["code"]]
+        for district in districts
+        if district.get("code") and district.get("name")
+    ]
+    for province, districts in all_districts_data.items()
+}
+
+# save the results to json, writing to a temporary file first so a crash mid-write can't corrupt it
 try:
-    with open(output_file_path, "w", encoding="utf-8") as f:
-        json.dump(results_data, f, indent=2, ensure_ascii=False)
+    tmp_file_path = output_file_path + ".tmp"
+    with open(tmp_file_path, "wb") as f:
+        f.write(orjson.dumps(results_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    os.replace(tmp_file_path, output_file_path)
+    # the run is complete, so the next one starts from scratch
+    os.remove(checkpoint_file_path)
     print(f"\nall districts processed. results saved to {output_file_path}")
 except IOError as e:
     print(f"\nerror writing results to {output_file_path}: {e}")
 
-print("\nscraping complete.") 
\ No newline at end of file
+print("\nscraping complete.")